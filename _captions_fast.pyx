@@ -0,0 +1,66 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""
+Optional compiled render_dialogues() for capcut_phrase_highlight_*.py.
+
+Build it next to the scripts (they fall back to pure Python without it):
+  pip install cython
+  cythonize -i _captions_fast.pyx
+"""
+
+from libc.math cimport rint
+from libc.stdint cimport int64_t
+
+
+cdef str _ass_time(double t):
+    """Seconds -> ASS h:mm:ss.cs, same rounding as ass_times()."""
+    cdef int64_t cs = <int64_t>rint(t * 100.0)
+    return f"{cs // 360000}:{(cs // 6000) % 60:02d}:{(cs // 100) % 60:02d}.{cs % 100:02d}"
+
+
+cpdef str render_dialogues(
+    list texts,
+    double[::1] starts,
+    double[::1] ends,
+    int[::1] group_starts,
+    int[::1] wrap_idx,
+    str hl_color,
+    str base_color,
+    str line_prefix,
+):
+    """
+    All Dialogue lines for contiguous phrase groups as one string.
+    group_starts[g] is the first word of group g (the group runs to the next
+    start, or to the end); wrap_idx[g] is its 2-line wrap index, 0 = single line.
+    starts/ends are the per-word Dialogue times from dialogue_times().
+    """
+    cdef Py_ssize_t n = len(texts)
+    cdef Py_ssize_t n_groups = group_starts.shape[0]
+    cdef Py_ssize_t g, i, g_start, g_end
+    cdef int wrap_i
+    cdef list buf = []
+    cdef list tokens
+    cdef str word, phrase
+    cdef str hl_open = "{\\c" + hl_color + "}"
+    cdef str hl_close = "{\\c" + base_color + "}"
+
+    for g in range(n_groups):
+        g_start = group_starts[g]
+        g_end = group_starts[g + 1] if g + 1 < n_groups else n
+        wrap_i = wrap_idx[g]
+        tokens = texts[g_start:g_end]
+
+        for i in range(g_end - g_start):
+            word = tokens[i]
+            tokens[i] = hl_open + word + hl_close
+            if wrap_i:
+                phrase = " ".join(tokens[:wrap_i]) + "\\N" + " ".join(tokens[wrap_i:])
+            else:
+                phrase = " ".join(tokens)
+            tokens[i] = word
+
+            buf.append(
+                f"Dialogue: 0,{_ass_time(starts[g_start + i])},{_ass_time(ends[g_start + i])},"
+                f"Phrase,,0,0,0,,{line_prefix}{phrase}\n"
+            )
+
+    return "".join(buf)
@@ -24,27 +24,123 @@ Workflow:
 3) Burn in:
    ffmpeg -i "caption1.mp4" -vf "ass=captions_phrase.ass" -c:a copy "caption1_phrase.mp4"
 
+Model:
+- Default is distil-large-v3 (large-v3 accuracy, much lower latency).
+- --model large-v3-turbo for multilingual audio.
+- --model small / --model tiny on low-RAM machines.
+
+GPU:
+- Whisper runs on CUDA with float16 automatically when a GPU is visible,
+  otherwise on CPU with int8.
+- Memory-constrained GPUs: --compute-type int8_float16
+- Force a device: --device cpu / --device cuda
+- --compute-type auto times a 5 s silent clip with each compute type the
+  hardware supports (CPU: int8 / int8_float16 / int8_bfloat16, CUDA:
+  float16 / int8_float16) and remembers the fastest per model + device +
+  --cpu-threads.
+  Tradeoff: int8 weights need ~4x less memory than float32 and ~2x less
+  than float16, which is what limits CPU speed; int8 dot products use
+  VNNI on recent x86. float16 activations are the fastest on most GPUs but
+  use the most VRAM.
+- CPU inference uses all cores (--cpu-threads to override).
+- With PyTorch (CUDA build) installed, log-mel feature extraction also runs
+  on the GPU instead of faster-whisper's NumPy STFT on the CPU, once a quick
+  check shows it matches the NumPy features.
+
+Decoding:
+- Greedy decoding (--beam-size 1, the default) with temperature 0 and no
+  conditioning on previous text: the decoder does a fraction of the work per
+  chunk and word timestamps stay snappy; WER is only slightly worse on
+  short-form speech. Use --beam-size 5 for accuracy-priority runs.
+
+Cache:
+- Transcriptions are cached in ./.whisper_cache keyed on the audio hash,
+  model, compute type and beam size, so re-runs that only tweak visuals
+  skip Whisper.
+- --no-cache forces a fresh transcription.
+
+Streaming:
+- --stream writes each phrase to the ASS file as soon as Whisper finishes it,
+  instead of after the whole transcription (only when not served from cache).
+
 Install:
-  pip install faster-whisper
+  pip install "faster-whisper>=1.1.0"   (BatchedInferencePipeline)
+  cythonize -i _captions_fast.pyx       (optional: compiled Dialogue rendering, needs cython)
+  pip install torch                     (optional: GPU log-mel features on CUDA)
 """
 
 from __future__ import annotations
 
-from typing import List, Dict, Optional
-from faster_whisper import WhisperModel
+from collections import namedtuple
+from typing import Iterable, Iterator, List, Optional, Sequence, TextIO
+from faster_whisper import WhisperModel, BatchedInferencePipeline
+from faster_whisper.feature_extractor import FeatureExtractor
 import argparse
+import ctranslate2
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+
+import numpy as np
+
+try:  # optional compiled renderer, see _captions_fast.pyx
+    from _captions_fast import render_dialogues as _render_dialogues_fast
+except ImportError:
+    _render_dialogues_fast = None
+
+
+# Transcript as parallel arrays (Structure-of-Arrays): text is a list[str],
+# starts/ends are float64 arrays, all indexed by word position.
+Words = namedtuple("Words", "text starts ends")
+
+
+class StreamWord:
+    """One word record while streaming (typed, ~3x smaller than a dict)."""
+
+    __slots__ = ("text", "start", "end")
+
+    def __init__(self, text: str, start: float, end: float):
+        self.text = text
+        self.start = start
+        self.end = end
+
+
+def make_words(texts: List[str], starts: Sequence[float], ends: Sequence[float]) -> Words:
+    return Words(
+        texts,
+        np.asarray(starts, dtype=np.float64),
+        np.asarray(ends, dtype=np.float64),
+    )
 
 
 # -----------------------
 # ASS helpers
 # -----------------------
-def ass_time(t: float) -> str:
-    """Convert seconds -> ASS time h:mm:ss.cs (centiseconds)."""
-    cs = int(round(t * 100))
-    s, cs = divmod(cs, 100)
-    m, s = divmod(s, 60)
-    h, m = divmod(m, 60)
-    return f"{h}:{m:02d}:{s:02d}.{cs:02d}"
+_CS_FIELDS = [f"{cs:02d}" for cs in range(100)]
+
+
+def ass_times(times: Sequence[float]) -> List[str]:
+    """
+    Seconds -> ASS times h:mm:ss.cs, rounded to centiseconds in one NumPy pass.
+    Dialogue times are (nearly) monotonic, so consecutive stamps usually share
+    the same whole second -> reuse its "h:mm:ss." prefix and only swap the cs field.
+    """
+    cs = np.round(np.asarray(times, dtype=np.float64) * 100).astype(np.int64)
+
+    out: List[str] = []
+    prev_s = -1
+    prefix = ""
+    for s, c in zip((cs // 100).tolist(), (cs % 100).tolist()):
+        if s != prev_s:
+            m, ss = divmod(s, 60)
+            h, m = divmod(m, 60)
+            prefix = f"{h}:{m:02d}:{ss:02d}."
+            prev_s = s
+        out.append(prefix + _CS_FIELDS[c])
+    return out
 
 
 def make_ass_header(
@@ -74,6 +170,353 @@ Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
 """
 
 
+# -----------------------
+# Whisper helpers
+# -----------------------
+def detect_device() -> str:
+    """Use CUDA when CTranslate2 can see a GPU, else fall back to CPU."""
+    return "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+
+
+def default_compute_type(device: str) -> str:
+    """float16 on GPU, int8 on CPU (use int8_float16 on small GPUs)."""
+    return "float16" if device == "cuda" else "int8"
+
+
+class TorchFeatureExtractor(FeatureExtractor):
+    """
+    Same log-mel spectrogram as faster-whisper's FeatureExtractor (n_fft 400,
+    hop 160, periodic Hann window; n_mels from the model's feat_kwargs, 128
+    for distil-large-v3 and large-v3, 80 for older models), computed with
+    torch on `device`. Returns float32 NumPy like the original, which is what
+    CTranslate2 takes.
+    """
+
+    def __init__(self, device: str = "cuda", **kwargs):
+        import torch
+
+        super().__init__(**kwargs)
+        self.device = device
+        self.window = torch.hann_window(self.n_fft, device=device)
+        self.mel_filters_t = torch.from_numpy(self.mel_filters).to(device)
+
+    def __call__(self, waveform: np.ndarray, padding=160, chunk_length=None):
+        import torch
+
+        if chunk_length is not None:
+            self.n_samples = chunk_length * self.sampling_rate
+            self.nb_max_frames = self.n_samples // self.hop_length
+
+        audio = torch.from_numpy(np.asarray(waveform, dtype=np.float32)).to(self.device)
+        if padding:
+            audio = torch.nn.functional.pad(audio, (0, padding))
+
+        stft = torch.stft(
+            audio, self.n_fft, self.hop_length, window=self.window, return_complex=True
+        )
+        magnitudes = stft[..., :-1].abs() ** 2
+
+        mel_spec = self.mel_filters_t @ magnitudes
+
+        log_spec = torch.clamp(mel_spec, min=1e-10).log10()
+        log_spec = torch.maximum(log_spec, log_spec.max() - 8.0)
+        log_spec = (log_spec + 4.0) / 4.0
+
+        return log_spec.cpu().numpy()
+
+
+def use_gpu_features(model: WhisperModel, device: str) -> None:
+    """
+    Swap in TorchFeatureExtractor when running on CUDA and torch can see the
+    GPU, but only after it reproduces the NumPy features on a noise sample.
+    """
+    if device != "cuda":
+        return
+    try:
+        import torch
+    except ImportError:
+        return
+    if not torch.cuda.is_available():
+        return
+
+    gpu = TorchFeatureExtractor(device="cuda", **model.feat_kwargs)
+    sample = np.random.default_rng(0).uniform(-0.5, 0.5, 16000).astype(np.float32)
+    expected = FeatureExtractor(**model.feat_kwargs)(sample)
+    if np.allclose(gpu(sample), expected, rtol=1e-3, atol=1e-3):
+        model.feature_extractor = gpu
+    else:
+        print("GPU log-mel features differ from NumPy; keeping the CPU extractor.")
+
+
+# Compute types worth timing per device; only those CTranslate2 reports as
+# supported by the hardware are tried.
+COMPUTE_TYPE_CANDIDATES = {
+    "cpu": ("int8", "int8_float16", "int8_bfloat16"),
+    "cuda": ("float16", "int8_float16"),
+}
+
+
+def pick_compute_type(
+    model_name: str,
+    device: str,
+    cpu_threads: int = 0,
+    warmup_seconds: float = 5.0,
+    runs: int = 3,
+) -> str:
+    """Load the model with each candidate compute type, time a silent clip, keep the fastest.
+
+    The first call per model is an untimed warm-up (allocations, kernel
+    selection); the score is the best of `runs` greedy passes at
+    temperature 0 so the fallback schedule can't add extra decodes.
+    """
+    supported = ctranslate2.get_supported_compute_types(device)
+    candidates = [ct for ct in COMPUTE_TYPE_CANDIDATES[device] if ct in supported]
+    if len(candidates) < 2:
+        return candidates[0] if candidates else default_compute_type(device)
+
+    silence = np.zeros(int(warmup_seconds * 16000), dtype=np.float32)
+
+    def run_once(model: WhisperModel) -> float:
+        t0 = time.perf_counter()
+        segments, _info = model.transcribe(
+            silence, language="en", beam_size=1, temperature=0.0
+        )
+        for _ in segments:
+            pass
+        return time.perf_counter() - t0
+
+    best = candidates[0]
+    best_time = float("inf")
+    for ct in candidates:
+        model = WhisperModel(
+            model_name, device=device, compute_type=ct, cpu_threads=cpu_threads
+        )
+        run_once(model)
+        elapsed = min(run_once(model) for _ in range(runs))
+        print(f"  {ct}: {elapsed:.2f}s")
+
+        if elapsed < best_time:
+            best_time = elapsed
+            best = ct
+        del model
+
+    return best
+
+
+def auto_compute_type(cache_dir: str, model_name: str, device: str, cpu_threads: int = 0) -> str:
+    """pick_compute_type() once per model + device + thread count; later runs reuse the stored answer."""
+    path = os.path.join(cache_dir, "compute_types.json")
+    key = f"{model_name}|{device}|{cpu_threads}"
+    chosen = load_json(path) or {}
+    if key not in chosen:
+        print(f"Timing compute types for {model_name} on {device}...")
+        chosen[key] = pick_compute_type(model_name, device, cpu_threads=cpu_threads)
+        write_json_atomic(path, chosen)
+    return chosen[key]
+
+
+def iter_transcribed_words(
+    audio_path: str,
+    model_name: str,
+    device: str,
+    compute_type: str,
+    batch_size: int = 16,
+    chunk_length: int = 30,
+    vad_min_silence_ms: int = 100,
+    cpu_threads: int = 0,
+    beam_size: int = 1,
+) -> Iterator[StreamWord]:
+    """
+    Run Whisper and yield each StreamWord as segments are decoded.
+    Silero VAD cuts the audio at silences >= vad_min_silence_ms into chunks of
+    at most chunk_length seconds; the chunks are decoded batch_size at a time
+    and their word timestamps come back already offset to absolute time;
+    words cut in two at a chunk boundary are merged (iter_segment_words()).
+    """
+    model = WhisperModel(
+        model_name,
+        device=device,
+        compute_type=compute_type,
+        cpu_threads=cpu_threads,
+        num_workers=1,
+    )
+    use_gpu_features(model, device)
+    batched = BatchedInferencePipeline(model=model)
+    segments, _info = batched.transcribe(
+        audio_path,
+        word_timestamps=True,
+        vad_filter=True,
+        vad_parameters={"min_silence_duration_ms": vad_min_silence_ms},
+        chunk_length=chunk_length,
+        batch_size=batch_size,
+        beam_size=beam_size,
+        condition_on_previous_text=False,
+        temperature=0.0,
+    )
+
+    yield from iter_segment_words(segments)
+
+
+# VAD chunks don't overlap, so a word split by a forced cut at chunk_length
+# comes back as two copies that touch (or nearly) rather than overlap.
+BOUNDARY_MERGE_GAP = 0.05
+
+
+def iter_segment_words(
+    segments: Iterable, max_gap: float = BOUNDARY_MERGE_GAP
+) -> Iterator[StreamWord]:
+    """
+    Cleaned words of the decoded segments, in order. When a segment starts
+    with the same word (case-insensitive) that the previous one ended on, at
+    most max_gap seconds later, the two copies are merged into one word.
+
+    >>> from types import SimpleNamespace as NS
+    >>> def seg(*words):
+    ...     return NS(words=[NS(word=w, start=a, end=b) for w, a, b in words])
+    >>> segments = [
+    ...     seg((" the", 29.5, 29.7), (" world", 29.7, 30.0)),
+    ...     seg((" World", 30.0, 30.3), (" again", 30.4, 30.8)),
+    ... ]
+    >>> [(w.text, w.start, w.end) for w in iter_segment_words(segments)]
+    [('the', 29.5, 29.7), ('world', 29.7, 30.3), ('again', 30.4, 30.8)]
+    >>> segments = [seg((" go", 1.0, 1.2)), seg((" go", 1.5, 1.7))]
+    >>> [(w.text, w.start, w.end) for w in iter_segment_words(segments)]
+    [('go', 1.0, 1.2), ('go', 1.5, 1.7)]
+    """
+    # Hold back one word: the next segment may extend it (see below).
+    prev: Optional[StreamWord] = None
+    for seg in segments:
+        if not seg.words:
+            continue
+        for j, w in enumerate(seg.words):
+            ww = clean_word(w.word)
+            if not ww:
+                continue
+
+            start = float(w.start)
+            end = float(w.end)
+
+            # A word cut by a chunk boundary can show up at the end of one chunk
+            # and the start of the next -> keep one copy spanning both.
+            if (
+                j == 0
+                and prev is not None
+                and prev.text.lower() == ww.lower()
+                and start - prev.end <= max_gap
+            ):
+                prev.end = max(prev.end, end)
+                continue
+
+            if prev is not None:
+                yield prev
+            prev = StreamWord(ww, start, end)
+
+    if prev is not None:
+        yield prev
+
+
+def transcribe_words(
+    audio_path: str,
+    model_name: str,
+    device: str,
+    compute_type: str,
+    batch_size: int = 16,
+    chunk_length: int = 30,
+    vad_min_silence_ms: int = 100,
+    cpu_threads: int = 0,
+    beam_size: int = 1,
+) -> Words:
+    """Run Whisper and flatten all segments into Words."""
+    texts: List[str] = []
+    starts_list: List[float] = []
+    ends_list: List[float] = []
+    for w in iter_transcribed_words(
+        audio_path,
+        model_name,
+        device=device,
+        compute_type=compute_type,
+        batch_size=batch_size,
+        chunk_length=chunk_length,
+        vad_min_silence_ms=vad_min_silence_ms,
+        cpu_threads=cpu_threads,
+        beam_size=beam_size,
+    ):
+        texts.append(w.text)
+        starts_list.append(w.start)
+        ends_list.append(w.end)
+
+    return make_words(texts, starts_list, ends_list)
+
+
+# -----------------------
+# Transcription cache
+# -----------------------
+def audio_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    """Hash the audio file contents in chunks (keeps memory flat for long files)."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def cache_path(
+    cache_dir: str,
+    audio_hash: str,
+    model_name: str,
+    compute_type: str,
+    beam_size: int = 1,
+) -> str:
+    # Model may be a local path or HF repo id -> keep the filename safe.
+    model_key = re.sub(r"[^\w.-]+", "_", model_name)
+    return os.path.join(
+        cache_dir, f"{audio_hash}_{model_key}_{compute_type}_b{beam_size}.json"
+    )
+
+
+def load_json(path: str):
+    """Return the parsed file, or None if missing/unreadable."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_json_atomic(path: str, obj) -> None:
+    """Write JSON atomically so an interrupted run never leaves a torn file."""
+    cache_dir = os.path.dirname(path) or "."
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(obj, f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def load_cached_words(path: str) -> Optional[Words]:
+    """Return cached words, or None if missing/unreadable (re-transcribe)."""
+    data = load_json(path)
+    try:
+        return make_words(data["text"], data["starts"], data["ends"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def save_cached_words(path: str, words: Words) -> None:
+    write_json_atomic(
+        path,
+        {
+            "text": words.text,
+            "starts": words.starts.tolist(),
+            "ends": words.ends.tolist(),
+        },
+    )
+
+
 # -----------------------
 # Caption building
 # -----------------------
@@ -81,97 +524,122 @@ def clean_word(w: str) -> str:
     return (w or "").strip()
 
 
-def merge_phrases(words: List[Dict[str, float | str]]) -> List[Dict[str, float | str]]:
+# Lowercase token sequence -> merged word. First match wins, so list longer
+# patterns (with a leading article to drop) before their fallbacks.
+BRAND_PHRASES: List[tuple[tuple[str, ...], str]] = [
+    (("a", "cap", "cut"), "CapCut"),
+    (("cap", "cut"), "CapCut"),
+]
+
+
+def merge_phrases(words: Words) -> Words:
     """
-    Merge common multi-token brand phrases and remove leading articles.
+    Merge common multi-token brand phrases (see BRAND_PHRASES) and remove leading articles.
     Example:
       "a" + "cap" + "cut" -> "CapCut"
     Timing is preserved from first start to last end.
     """
-    out: List[Dict[str, float | str]] = []
+    text, starts, ends = words
+    lc = tuple(t.lower() for t in text)
+    keep_start: List[int] = []  # index of first source word of each output word
+    keep_end: List[int] = []  # index of last source word of each output word
+    out_text: List[str] = []
     i = 0
 
-    while i < len(words):
-        w = str(words[i]["word"]).lower()
-
-        # a + cap + cut -> CapCut
-        if (
-            i + 2 < len(words)
-            and w == "a"
-            and str(words[i + 1]["word"]).lower() == "cap"
-            and str(words[i + 2]["word"]).lower() == "cut"
-        ):
-            out.append(
-                {
-                    "word": "CapCut",
-                    "start": float(words[i]["start"]),
-                    "end": float(words[i + 2]["end"]),
-                }
-            )
-            i += 3
-            continue
+    while i < len(text):
+        for pattern, merged in BRAND_PHRASES:
+            n = len(pattern)
+            if lc[i : i + n] == pattern:
+                out_text.append(merged)
+                keep_start.append(i)
+                keep_end.append(i + n - 1)
+                i += n
+                break
+        else:
+            out_text.append(text[i])
+            keep_start.append(i)
+            keep_end.append(i)
+            i += 1
+
+    return Words(out_text, starts[keep_start], ends[keep_end])
+
+
+def _find_group_breaks(
+    starts: List[float],
+    ends: List[float],
+    lens: List[int],
+    max_words: int,
+    max_chars: int,
+    max_gap: float,
+) -> List[int]:
+    """Scalar scan over the word lists -> group-start indices."""
+    breaks = [0] if lens else []
+    g_start = 0
+    cur_len = 0
 
-        # cap + cut -> CapCut (fallback)
-        if (
-            i + 1 < len(words)
-            and w == "cap"
-            and str(words[i + 1]["word"]).lower() == "cut"
+    for i, n in enumerate(lens):
+        if i > g_start and (
+            starts[i] - ends[i - 1] > max_gap
+            or i - g_start >= max_words
+            or cur_len + n + 1 > max_chars
         ):
-            out.append(
-                {
-                    "word": "CapCut",
-                    "start": float(words[i]["start"]),
-                    "end": float(words[i + 1]["end"]),
-                }
-            )
-            i += 2
-            continue
+            breaks.append(i)
+            g_start = i
+            cur_len = 0
 
-        out.append(words[i])
-        i += 1
+        cur_len = cur_len + n + 1 if cur_len else n
 
-    return out
+    return breaks
 
 
 def group_words(
-    words: List[Dict[str, float | str]],
+    words: Words,
     max_words: int = 7,
     max_chars: int = 28,
     max_gap: float = 0.65,
-) -> List[List[Dict[str, float | str]]]:
+) -> List[tuple[int, int]]:
     """
     Groups words into short phrases similar to modern short-form captions.
+    Returns (start, end) index pairs: group k is words.text[start:end].
     Splits when:
       - pause between words exceeds max_gap
       - phrase word count exceeds max_words
       - phrase character length exceeds max_chars
     """
-    groups: List[List[Dict[str, float | str]]] = []
-    cur: List[Dict[str, float | str]] = []
-    cur_len = 0
-    last_end: Optional[float] = None
-
-    for w in words:
-        txt = str(w["word"])
-        start = float(w["start"])
-        end = float(w["end"])
+    text, starts, ends = words
+    # Interpreted loop: Python floats/ints index much faster than NumPy scalars.
+    breaks = _find_group_breaks(
+        starts.tolist(),
+        ends.tolist(),
+        [len(t) for t in text],
+        int(max_words),
+        int(max_chars),
+        float(max_gap),
+    )
+    return list(zip(breaks, breaks[1:] + [len(text)]))
 
-        gap = (start - last_end) if last_end is not None else 0.0
-        would_len = cur_len + (len(txt) + (1 if cur else 0))
 
-        if cur and (gap > max_gap or len(cur) >= max_words or would_len > max_chars):
-            groups.append(cur)
-            cur = []
-            cur_len = 0
-
-        cur.append({"word": txt, "start": start, "end": end})
-        cur_len = cur_len + len(txt) + (1 if cur_len else 0)
-        last_end = end
+def dialogue_times(
+    words: Words,
+    groups: List[tuple[int, int]],
+    min_word_dur: float = 0.10,
+    end_tail: float = 0.06,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Start/end of each word-Dialogue (one per word, in word order).
+    A highlight ends at the next word's start for a snappy feel; the last word
+    of a phrase keeps its own end. Short highlights are padded to min_word_dur,
+    then every line holds end_tail longer.
+    """
+    starts, ends = words.starts, words.ends
 
-    if cur:
-        groups.append(cur)
+    end = np.empty_like(starts)
+    end[:-1] = starts[1:]
+    last = np.fromiter((g_end - 1 for _, g_end in groups), dtype=np.intp, count=len(groups))
+    end[last] = ends[last]
 
-    return groups
+    end = np.where((end - starts) < min_word_dur, starts + min_word_dur, end)
+    return starts, end + end_tail
 
 
 def choose_wrap_index(words: List[str]) -> Optional[int]:
@@ -184,60 +652,182 @@ def choose_wrap_index(words: List[str]) -> Optional[int]:
         return None
 
     # Only wrap if the phrase is "long enough"
-    total_len = len(" ".join(words))
+    lens = [len(w) for w in words]
+    total_len = sum(lens) + len(words) - 1  # joined with single spaces
     if total_len <= 18:
         return None
 
+    # Single pass: grow the left line one word at a time; the right line is
+    # whatever remains minus the space at the break.
     best_i = 1
     best_score = 10**9
+    left_len = -1
     for i in range(1, len(words)):
-        left = " ".join(words[:i])
-        right = " ".join(words[i:])
-        score = abs(len(left) - len(right))
+        left_len += lens[i - 1] + 1
+        score = abs(left_len - (total_len - left_len - 1))
         if score < best_score:
             best_score = score
             best_i = i
     return best_i
 
 
-def build_highlight_phrase(
-    word_objs: List[Dict[str, float | str]],
+def render_phrase(
+    words: List[str],
+    wrap_i: Optional[int],
     active_idx: int,
     highlight_color: str = "&H00FFFF00&",  # magenta-ish (ASS uses BGR)
     base_color: str = "&H00FFFFFF&",  # white
     pop_scale_x: int = 120,  # HORIZONTAL pop only (prevents vertical jumping)
-    force_two_lines: bool = True,
 ) -> str:
     """
     Build phrase text where only active word is colored + slightly widened (x-scale).
     IMPORTANT: fscy stays 100 to prevent vertical bbox changes -> no jumping.
+    wrap_i is the phrase's choose_wrap_index() (None = single line), computed
+    once per group.
     """
-    words = [str(w["word"]) for w in word_objs]
-    wrap_i = choose_wrap_index(words) if force_two_lines else None
+    tokens = list(words)
+    if 0 <= active_idx < len(tokens):
+        tokens[active_idx] = rf"{{\c{highlight_color}}}{tokens[active_idx]}{{\c{base_color}}}"
 
-    parts: List[str] = []
-    for i, w in enumerate(words):
-        token = w
-        if i == active_idx:
-            token = rf"{{\c{highlight_color}}}{w}{{\c{base_color}}}"
+    if not wrap_i:
+        return " ".join(tokens)
 
-        parts.append(token)
+    # ASS newline between the two lines, no spaces around it
+    return " ".join(tokens[:wrap_i]) + r"\N" + " ".join(tokens[wrap_i:])
 
-        # Insert ASS newline between words if wrapped
-        if wrap_i is not None and i == wrap_i - 1:
-            parts.append(r"\N")
 
-    # Join with spaces, but avoid extra spaces around \N
-    out: List[str] = []
-    for t in parts:
-        if t == r"\N":
-            if out:
-                out[-1] = out[-1].rstrip()
-            out.append(r"\N")
-        else:
-            out.append(t + " ")
+def render_dialogues(
+    words: Words,
+    groups: List[tuple[int, int]],
+    line_prefix: str,
+    highlight_color: str = "&H00FFFF00&",
+    base_color: str = "&H00FFFFFF&",
+    pop_scale_x: int = 120,
+    force_two_lines: bool = True,
+    min_word_dur: float = 0.10,
+    end_tail: float = 0.06,
+) -> str:
+    """
+    ASS Dialogue lines for the given phrase groups: one per word, where the
+    full phrase stays visible and only the active word changes.
+    Uses the compiled _captions_fast renderer when it has been built.
+    """
+    # Every word-Dialogue's timing at once; text below, then one formatting pass.
+    starts, ends = dialogue_times(words, groups, min_word_dur=min_word_dur, end_tail=end_tail)
+    wrap_idx = [
+        choose_wrap_index(words.text[g_start:g_end]) if force_two_lines else None
+        for g_start, g_end in groups
+    ]
+
+    if _render_dialogues_fast is not None:
+        return _render_dialogues_fast(
+            words.text,
+            starts,
+            ends,
+            np.array([g_start for g_start, _ in groups], dtype=np.int32),
+            np.array([wrap_i or 0 for wrap_i in wrap_idx], dtype=np.int32),
+            highlight_color,
+            base_color,
+            line_prefix,
+        )
 
-    return "".join(out).strip()
+    texts: List[str] = []
+    for (g_start, g_end), wrap_i in zip(groups, wrap_idx):
+        phrase_words = words.text[g_start:g_end]
+        for i in range(g_end - g_start):
+            phrase = render_phrase(
+                phrase_words,
+                wrap_i,
+                active_idx=i,
+                highlight_color=highlight_color,
+                base_color=base_color,
+                pop_scale_x=pop_scale_x,
+            )
+            texts.append(line_prefix + phrase)
+
+    return "".join(
+        f"Dialogue: 0,{a},{b},Phrase,,0,0,0,,{text}\n"
+        for a, b, text in zip(ass_times(starts), ass_times(ends), texts)
+    )
+
+
+# -----------------------
+# Streaming
+# -----------------------
+def iter_merged_words(
+    words: Iterable[StreamWord],
+) -> Iterator[StreamWord]:
+    """
+    Incremental merge_phrases(): keeps a window just long enough for the
+    longest BRAND_PHRASES pattern, so words flow through as they arrive.
+    """
+    window_size = max(len(pattern) for pattern, _ in BRAND_PHRASES)
+    window: List[StreamWord] = []
+
+    def pop_head() -> StreamWord:
+        lc = tuple(w.text.lower() for w in window)
+        for pattern, merged in BRAND_PHRASES:
+            n = len(pattern)
+            if lc[:n] == pattern:
+                head = StreamWord(merged, window[0].start, window[n - 1].end)
+                del window[:n]
+                return head
+        return window.pop(0)
+
+    for w in words:
+        window.append(w)
+        if len(window) >= window_size:
+            yield pop_head()
+
+    while window:
+        yield pop_head()
+
+
+def iter_groups(
+    words: Iterable[StreamWord],
+    max_words: int = 7,
+    max_chars: int = 28,
+    max_gap: float = 0.65,
+) -> Iterator[List[StreamWord]]:
+    """Incremental group_words(): yield each phrase as soon as it closes."""
+    cur: List[StreamWord] = []
+    cur_len = 0
+    last_end: Optional[float] = None
+
+    for w in words:
+        gap = (w.start - last_end) if last_end is not None else 0.0
+        would_len = cur_len + (len(w.text) + (1 if cur else 0))
+
+        if cur and (gap > max_gap or len(cur) >= max_words or would_len > max_chars):
+            yield cur
+            cur = []
+            cur_len = 0
+
+        cur.append(w)
+        cur_len = cur_len + len(w.text) + (1 if cur_len else 0)
+        last_end = w.end
+
+    if cur:
+        yield cur
+
+
+def stream_dialogues(
+    f: TextIO,
+    words: Iterable[StreamWord],
+    max_words: int = 7,
+    max_chars: int = 28,
+    max_gap: float = 0.65,
+    **render_kwargs,
+) -> None:
+    """Write each closed phrase group's Dialogue lines to f and flush."""
+    for group in iter_groups(
+        iter_merged_words(words), max_words=max_words, max_chars=max_chars, max_gap=max_gap
+    ):
+        words_soa = make_words(
+            [w.text for w in group], [w.start for w in group], [w.end for w in group]
+        )
+        f.write(render_dialogues(words_soa, [(0, len(group))], **render_kwargs))
+        f.flush()
 
 
 # -----------------------
@@ -318,16 +908,78 @@ def main() -> None:
     parser.add_argument("--fad-in", type=int, default=30, help="Fade-in ms (default: 30)")
     parser.add_argument("--fad-out", type=int, default=60, help="Fade-out ms (default: 60)")
 
+    # Whisper model/device
+    parser.add_argument(
+        "--model",
+        default="distil-large-v3",
+        help="Whisper model name or path (default: distil-large-v3; "
+        "large-v3-turbo, or small/tiny on low-RAM machines)",
+    )
+    parser.add_argument(
+        "--device",
+        choices=["cpu", "cuda"],
+        default=None,
+        help="Inference device (default: cuda if available, else cpu)",
+    )
+    parser.add_argument(
+        "--compute-type",
+        default=None,
+        help="CTranslate2 compute type, or 'auto' to time the supported ones once "
+        "(default: float16 on cuda, int8 on cpu; int8_float16 saves GPU memory)",
+    )
+    parser.add_argument(
+        "--beam-size",
+        type=int,
+        default=1,
+        help="Decoder beam size (default: 1 = greedy, fastest; 5 for accuracy-priority runs)",
+    )
+    parser.add_argument(
+        "--cpu-threads",
+        type=int,
+        default=None,
+        help="CPU inference threads (default: all cores)",
+    )
+
+    # Cache
+    parser.add_argument(
+        "--cache-dir",
+        default=".whisper_cache",
+        help="Transcription cache directory (default: .whisper_cache)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Ignore cached transcriptions and always run Whisper",
+    )
+
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Write phrases to the ASS file while Whisper is still transcribing",
+    )
+
     args = parser.parse_args()
 
     # -------- Settings (now from args) --------
     audio_path = args.audio
     out_ass = args.output
 
-    # Whisper model/device (leave hardcoded for now)
-    model_name = "small"
-    device = "cpu"
-    compute_type = "int8"
+    # Whisper model/device
+    model_name = args.model
+    device = args.device if args.device is not None else detect_device()
+    cpu_threads = args.cpu_threads if args.cpu_threads is not None else (os.cpu_count() or 0)
+    if args.compute_type == "auto":
+        compute_type = auto_compute_type(
+            args.cache_dir, model_name, device, cpu_threads=cpu_threads
+        )
+    elif args.compute_type is not None:
+        compute_type = args.compute_type
+    else:
+        compute_type = default_compute_type(device)
+    beam_size = args.beam_size
+    batch_size = 16  # VAD chunks decoded in parallel; lower if you run out of memory
+    chunk_length = 30  # max seconds per VAD chunk (Whisper window)
+    vad_min_silence_ms = 100  # cut chunks at pauses at least this long
 
     # Phrase grouping
     max_words_per_phrase = args.max_words
@@ -364,18 +1016,83 @@ def main() -> None:
     fad_out_ms = args.fad_out
     # ---------------------------------------
 
-    model = WhisperModel(model_name, device=device, compute_type=compute_type)
-    segments, _info = model.transcribe(audio_path, word_timestamps=True, vad_filter=True)
+    header = make_ass_header(
+        play_res_x=play_res_x,
+        play_res_y=play_res_y,
+        size=font_size,
+    )
 
-    # Collect words (flat list)
-    all_words: List[Dict[str, float | str]] = []
-    for seg in segments:
-        if not seg.words:
-            continue
-        for w in seg.words:
-            ww = clean_word(w.word)
-            if ww:
-                all_words.append({"word": ww, "start": float(w.start), "end": float(w.end)})
+    # Absolute positioning + fade. \an2 anchors bottom-center at pos(x,y).
+    # Same for every line -> build it once.
+    line_prefix = rf"{{\an2\pos({pos_x},{pos_y})\fad({fad_in_ms},{fad_out_ms})}}"
+    render_kwargs = dict(
+        line_prefix=line_prefix,
+        highlight_color=highlight_color,
+        base_color="&H00FFFFFF&",
+        pop_scale_x=pop_scale_x,
+        force_two_lines=force_two_lines,
+        min_word_dur=min_word_dur,
+        end_tail=end_tail,
+    )
+
+    # Whisper is the expensive step -> reuse a previous run on the same audio.
+    cached_words_path = cache_path(
+        args.cache_dir, audio_sha256(audio_path), model_name, compute_type, beam_size
+    )
+    all_words: Optional[Words] = None if args.no_cache else load_cached_words(cached_words_path)
+    if all_words is not None:
+        print(f"Using cached transcription {cached_words_path}")
+    elif args.stream:
+        # Emit each phrase as soon as it closes; keep the raw words for the cache.
+        texts: List[str] = []
+        starts_list: List[float] = []
+        ends_list: List[float] = []
+
+        def recorded_words() -> Iterator[StreamWord]:
+            for w in iter_transcribed_words(
+                audio_path,
+                model_name,
+                device=device,
+                compute_type=compute_type,
+                batch_size=batch_size,
+                chunk_length=chunk_length,
+                vad_min_silence_ms=vad_min_silence_ms,
+                cpu_threads=cpu_threads,
+                beam_size=beam_size,
+            ):
+                texts.append(w.text)
+                starts_list.append(w.start)
+                ends_list.append(w.end)
+                yield w
+
+        with open(out_ass, "w", encoding="utf-8") as f:
+            f.write(header)
+            f.flush()
+            stream_dialogues(
+                f,
+                recorded_words(),
+                max_words=max_words_per_phrase,
+                max_chars=max_chars_per_phrase,
+                max_gap=max_gap_seconds,
+                **render_kwargs,
+            )
+
+        save_cached_words(cached_words_path, make_words(texts, starts_list, ends_list))
+        print(f"Wrote {out_ass}")
+        return
+    else:
+        all_words = transcribe_words(
+            audio_path,
+            model_name,
+            device=device,
+            compute_type=compute_type,
+            batch_size=batch_size,
+            chunk_length=chunk_length,
+            vad_min_silence_ms=vad_min_silence_ms,
+            cpu_threads=cpu_threads,
+            beam_size=beam_size,
+        )
+        save_cached_words(cached_words_path, all_words)
 
     all_words = merge_phrases(all_words)
 
@@ -386,45 +1103,12 @@ def main() -> None:
         max_gap=max_gap_seconds,
     )
 
-    with open(out_ass, "w", encoding="utf-8") as f:
-        f.write(
-            make_ass_header(
-                play_res_x=play_res_x,
-                play_res_y=play_res_y,
-                size=font_size,
-            )
-        )
+    # Build the whole file in memory -> a single write instead of one per line.
+    buf: List[str] = [header]
+    buf.append(render_dialogues(all_words, groups, **render_kwargs))
 
-        for g in groups:
-            # One Dialogue per word: full phrase stays visible, only active word changes.
-            for i in range(len(g)):
-                start = float(g[i]["start"])
-
-                # End at next word start for snappy highlight, else use word end
-                if i < len(g) - 1:
-                    end = float(g[i + 1]["start"])
-                else:
-                    end = float(g[i]["end"])
-
-                if (end - start) < min_word_dur:
-                    end = start + min_word_dur
-                end += end_tail
-
-                phrase = build_highlight_phrase(
-                    g,
-                    active_idx=i,
-                    highlight_color=highlight_color,
-                    base_color="&H00FFFFFF&",
-                    pop_scale_x=pop_scale_x,
-                    force_two_lines=force_two_lines,
-                )
-
-                # Absolute positioning + fade. \an2 anchors bottom-center at pos(x,y).
-                text = rf"{{\an2\pos({pos_x},{pos_y})\fad({fad_in_ms},{fad_out_ms})}}{phrase}"
-
-                f.write(
-                    f"Dialogue: 0,{ass_time(start)},{ass_time(end)},Phrase,,0,0,0,,{text}\n"
-                )
+    with open(out_ass, "w", encoding="utf-8") as f:
+        f.write("".join(buf))
 
     print(f"Wrote {out_ass}")
 